@@ -1,83 +1,286 @@
 import json
 import re
 import os       # <-- IMPORT OS
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 import time
+from functools import lru_cache
+from typing import Optional
+
+try:
+    import orjson  # faster parse/dump for the abbreviation file
+except ImportError:
+    orjson = None
+
+try:
+    import re2  # google-re2: linear-time DFA scanner in C++
+except ImportError:
+    re2 = None
+
+try:
+    import numpy as np
+    from numba import njit  # optional: compiles the ASCII acronym scanner
+except ImportError:
+    njit = None
 
 ABBREVIATION_FILE = "abbreviations_local.json"
+# New model expansions are appended here and folded into ABBREVIATION_FILE
+# once the log grows past ABBREVIATION_LOG_MAX_BYTES
+ABBREVIATION_LOG_MAX_BYTES = 64 * 1024
+MISSED_ACRONYMS_FILE = "acronym_misses.json"
+# Serialises reads, appends and compaction of the abbreviation file and its
+# log across request threads (re-entrant: compaction loads and saves)
+_abbreviations_lock = threading.RLock()
 
-def load_abbreviations(file_path=ABBREVIATION_FILE) -> dict:
-    # ... (rest of function is unchanged)
-    if not os.path.exists(file_path):
-        print(f" No abbreviation file found, creating new one: {file_path}")
-        with open(file_path, "w") as f:
-            json.dump({}, f)
-        return {}
+# Acronyms the model could not expand are not sent again until this expires
+MISSED_ACRONYM_TTL = 24 * 60 * 60  # seconds
+
+_missed_acronyms = None  # acronym -> timestamp of the unanswered model call
+# Request threads share _missed_acronyms; hold this to load, read or update it
+_missed_acronyms_lock = threading.Lock()
+
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-09-2025:generateContent"
+GEMINI_TIMEOUT = (3, 30)  # (connect, read) seconds
+
+# [PERF] Keep-alive session so repeat calls skip the TCP/TLS handshake
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+SESSION.headers.update({"Content-Type": "application/json", "Connection": "keep-alive"})
+
+# Static part of every acronym request (built once at import)
+_EXPANSION_REQUEST_CONFIG = {
+    "systemInstruction": {
+        "parts": [{ "text": (
+            "You are an expert-level 'Acronym Disambiguation' tool. "
+            "Your job is to determine the full expansion of an acronym based on its context. "
+            "Analyze the user's text to find the most likely meaning for each acronym provided. "
+            "Respond *only* with a JSON object."
+        ) }]
+    },
+    "generationConfig": {
+        "responseMimeType": "application/json",
+        "responseSchema": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "acronym": { "type": "STRING" },
+                    "expansion": { "type": "STRING" }
+                },
+                "propertyOrdering": ["acronym", "expansion"]
+            }
+        }
+    }
+}
+
+# Two or more consecutive capitals, e.g. "KPI", "NLP" (compiled once at import)
+_ACRONYM_RE = re.compile(r"\b[A-Z]{2,}\b")
+# ASCII-only word boundaries skip SRE's Unicode checks (~2x faster) and give
+# identical matches whenever the text itself is pure ASCII. RE2's \b is always
+# ASCII-only ("éKPI" would match), so RE2 is only used for ASCII text too.
+_ACRONYM_ASCII_RE = re2.compile(r"\b[A-Z]{2,}\b") if re2 is not None else re.compile(r"\b[A-Z]{2,}\b", re.ASCII)
+
+def _scan_uppercase_runs(buf, out) -> int:
+    """
+    Hand-written equivalent of _ACRONYM_ASCII_RE over an ASCII byte buffer.
+    Writes (start, end) pairs into `out` and returns the number of ints written.
+    """
+    n = buf.shape[0]
+    count = 0
+    i = 0
+    while i < n:
+        c = buf[i]
+        prev = buf[i - 1] if i > 0 else 32
+        prev_is_word = (48 <= prev <= 57) or (65 <= prev <= 90) or (97 <= prev <= 122) or prev == 95
+        if 65 <= c <= 90 and not prev_is_word:
+            j = i + 1
+            while j < n and 65 <= buf[j] <= 90:
+                j += 1
+            nxt = buf[j] if j < n else 32
+            next_is_word = (48 <= nxt <= 57) or (65 <= nxt <= 90) or (97 <= nxt <= 122) or nxt == 95
+            if j - i >= 2 and not next_is_word:
+                out[count] = i
+                out[count + 1] = j
+                count += 2
+            i = j
+        else:
+            i += 1
+    return count
+
+# [PERF] Machine-code scan when numba is installed; the pure-Python loop
+# above would be slower than SRE, so it is only used compiled
+_scan_uppercase_runs_jit = njit(cache=True)(_scan_uppercase_runs) if njit is not None else None
+
+def _acronym_spans(text: str) -> list:
+    """Returns the (start, end) span of every acronym in the text."""
+    if not text.isascii():
+        return [m.span() for m in _ACRONYM_RE.finditer(text)]
+    if _scan_uppercase_runs_jit is not None:
+        buf = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        # Runs need >= 3 chars each (2 capitals + separator), so this always fits
+        out = np.empty(len(buf) + 2, dtype=np.int32)
+        n = _scan_uppercase_runs_jit(buf, out)
+        return out[:n].reshape(-1, 2).tolist()
+    return [m.span() for m in _ACRONYM_ASCII_RE.finditer(text)]
+
+def _loads(raw: bytes):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def _read_json(file_path: str) -> dict:
+    with open(file_path, "rb") as f:
+        return _loads(f.read())
+
+def _write_json(data: dict, file_path: str):
+    """Writes to a temp file and swaps it in, so readers never see a partial file."""
+    # One temp file per writer, so concurrent writes never replace each other's
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        with open(file_path, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
+        if orjson is not None:
+            with open(tmp_path, "wb") as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+def _log_path(file_path: str) -> str:
+    return os.path.splitext(file_path)[0] + ".jsonl"
+
+def _mtime_ns(file_path: str) -> Optional[int]:
+    try:
+        return os.stat(file_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+@lru_cache(maxsize=4)
+def _load(file_path: str, mtime_ns: int, log_mtime_ns: Optional[int]) -> dict:
+    """Parses the abbreviation file plus its append log; cached until either changes."""
+    try:
+        data = _read_json(file_path)
+    except json.JSONDecodeError:  # orjson.JSONDecodeError subclasses this
         print(f"Warning: Corrupt JSON file at {file_path}. Creating a new one.")
-        with open(file_path, "w") as f:
-            json.dump({}, f)
-        return {}
+        _write_json({}, file_path)
+        data = {}
+    if log_mtime_ns is not None:
+        with open(_log_path(file_path), "rb") as f:
+            for line in f:
+                try:
+                    data.update(_loads(line))
+                except json.JSONDecodeError:
+                    continue  # skip a torn final line
+    return data
+
+def load_abbreviations(file_path=ABBREVIATION_FILE) -> dict:
+    # [PERF] Only re-read the JSON when the file or its log changed on disk
+    with _abbreviations_lock:
+        if not os.path.exists(file_path):
+            print(f" No abbreviation file found, creating new one: {file_path}")
+            _write_json({}, file_path)
+        # A copy, so callers can't change the cached dict shared by every request
+        return dict(_load(file_path, _mtime_ns(file_path), _mtime_ns(_log_path(file_path))))
+
+def abbreviations_version(file_path=ABBREVIATION_FILE) -> tuple:
+    """Changes whenever the abbreviation file or its log does; lets callers key caches on it."""
+    return _mtime_ns(file_path), _mtime_ns(_log_path(file_path))
 
 def save_abbreviations(data: dict, file_path=ABBREVIATION_FILE):
-    # ... (rest of function is unchanged)
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=2)
+    """Replaces the whole dictionary; the append log is folded in and removed."""
+    with _abbreviations_lock:
+        _write_json(data, file_path)
+        try:
+            os.remove(_log_path(file_path))
+        except FileNotFoundError:
+            pass
+        _load.cache_clear()
 
-def get_expansions_from_model(acronyms: list, full_text: str) -> dict:
-    # ... (rest of function is unchanged)
+def append_abbreviations(expansions: dict, file_path=ABBREVIATION_FILE):
+    """Appends new expansions to the log instead of rewriting the whole file."""
+    lines = [json.dumps({key: value}).encode("utf-8") + b"\n" for key, value in expansions.items()]
+    log_path = _log_path(file_path)
+    # Held through compaction, so no append lands between its load and the log's removal
+    with _abbreviations_lock:
+        with open(log_path, "a+b") as f:
+            # Terminate a torn last line so it cannot swallow the new entries
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    lines.insert(0, b"\n")
+            f.write(b"".join(lines))
+        if os.path.getsize(log_path) > ABBREVIATION_LOG_MAX_BYTES:
+            save_abbreviations(load_abbreviations(file_path), file_path)
+
+def _load_missed_acronyms() -> dict:
+    """Loads the negative cache of acronyms the model could not expand (call with the lock held)."""
+    global _missed_acronyms
+    if _missed_acronyms is None:
+        _missed_acronyms = {}
+        if os.path.exists(MISSED_ACRONYMS_FILE):
+            try:
+                _missed_acronyms = _read_json(MISSED_ACRONYMS_FILE)
+            except json.JSONDecodeError:
+                print(f"Warning: Corrupt JSON file at {MISSED_ACRONYMS_FILE}. Ignoring it.")
+    return _missed_acronyms
+
+def _recently_missed(acronyms: list) -> set:
+    """Returns the acronyms the model already failed to expand within the TTL."""
+    now = time.time()
+    with _missed_acronyms_lock:
+        missed = _load_missed_acronyms()
+        return {ac for ac in acronyms if now - missed.get(ac.lower(), 0) < MISSED_ACRONYM_TTL}
+
+def _remember_missed(acronyms: list):
+    """Records unanswered acronyms and drops expired entries."""
+    now = time.time()
+    with _missed_acronyms_lock:
+        missed = _load_missed_acronyms()
+        for ac in acronyms:
+            missed[ac.lower()] = now
+        for key in [k for k, seen in missed.items() if now - seen >= MISSED_ACRONYM_TTL]:
+            del missed[key]
+        _write_json(missed, MISSED_ACRONYMS_FILE)
+
+def get_expansions_from_model(acronyms: list, full_text: str) -> Optional[dict]:
+    """
+    Asks Gemini for the expansions of the given acronyms.
+    Returns None if the API could not be reached, so callers can tell
+    a failed call apart from a model that simply had no answer.
+    """
     print(f"Calling Gemini API to find meanings for: {acronyms}")
     
-    system_prompt = (
-        "You are an expert-level 'Acronym Disambiguation' tool. "
-        "Your job is to determine the full expansion of an acronym based on its context. "
-        "Analyze the user's text to find the most likely meaning for each acronym provided. "
-        "Respond *only* with a JSON object."
-    )
     user_prompt = (
         f"Based on the following document context, what do these acronyms most likely stand for?\n"
         f"Acronyms to find: {', '.join(acronyms)}\n\n"
         f"Document Context:\n\"\"\"\n{full_text}\n\"\"\""
     )
-    json_schema = {
-        "type": "ARRAY",
-        "items": {
-            "type": "OBJECT",
-            "properties": {
-                "acronym": { "type": "STRING" },
-                "expansion": { "type": "STRING" }
-            },
-            "propertyOrdering": ["acronym", "expansion"]
-        }
-    }
     payload = {
         "contents": [{ "parts": [{ "text": user_prompt }] }],
-        "systemInstruction": {
-            "parts": [{ "text": system_prompt }]
-        },
-        "generationConfig": {
-            "responseMimeType": "application/json",
-            "responseSchema": json_schema
-        }
+        **_EXPANSION_REQUEST_CONFIG,
     }
     
     # [FIX] Read the key from an environment variable
     apiKey = os.getenv("GEMINI_API_KEY")
     if not apiKey:
         print("ERROR: GEMINI_API_KEY environment variable not set.")
-        return {} # Fail fast if key is missing
+        return None # Fail fast if key is missing
 
-    apiUrl = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-09-2025:generateContent?key={apiKey}"
-    
     # ... (rest of function is unchanged)
     max_retries = 3
     delay = 1
     for attempt in range(max_retries):
         try:
-            response = requests.post(apiUrl, json=payload, headers={'Content-Type': 'application/json'})
+            response = SESSION.post(
+                GEMINI_API_URL,
+                json=payload,
+                headers={"x-goog-api-key": apiKey},
+                timeout=GEMINI_TIMEOUT,
+            )
             
             if response.status_code == 200:
                 result = response.json()
@@ -97,35 +300,49 @@ def get_expansions_from_model(acronyms: list, full_text: str) -> dict:
                 time.sleep(delay)
                 delay *= 2
             else:
-                return {}
-    return {}
+                return None
+    return None
 
 def expand_acronyms(text: str) -> tuple[str, list[str]]:
     # ... (rest of function is unchanged)
     abbreviations = load_abbreviations()
-    all_acronyms_in_text = set(re.findall(r"\b[A-Z]{2,}\b", text))
+    # Scan once; the same spans are reused to rebuild the text below
+    spans = _acronym_spans(text)
+    all_acronyms_in_text = {text[start:end] for start, end in spans}
     unknown_acronyms = [ac for ac in all_acronyms_in_text if ac.lower() not in abbreviations]
     
-    if unknown_acronyms:
-        model_expansions = get_expansions_from_model(unknown_acronyms, text)
+    # [PERF] Skip the Gemini round-trip for acronyms it recently failed on
+    recently_missed = _recently_missed(unknown_acronyms)
+    if recently_missed:
+        print(f"Skipping recently unresolved acronyms: {sorted(recently_missed)}")
+    acronyms_to_ask = [ac for ac in unknown_acronyms if ac not in recently_missed]
+
+    if acronyms_to_ask:
+        model_expansions = get_expansions_from_model(acronyms_to_ask, text)
         if model_expansions:
             print(f"Model found new expansions: {model_expansions}")
             abbreviations.update(model_expansions)
-            save_abbreviations(abbreviations)
+            append_abbreviations(model_expansions)
         else:
             print("Model could not find expansions for unknown acronyms.")
+        if model_expansions is not None:
+            _remember_missed([ac for ac in acronyms_to_ask if ac.lower() not in model_expansions])
 
-    expanded_text = text
-    final_unknown = []
-    
-    for acronym in all_acronyms_in_text:
-        key = acronym.lower()
-        if key in abbreviations:
-            pattern = r"\b" + re.escape(acronym) + r"\b"
-            expansion_text = f"{abbreviations[key].title()} ({acronym.upper()})"
-            expanded_text = re.sub(pattern, expansion_text, expanded_text)
-        else:
-            final_unknown.append(acronym)
+    final_unknown = [ac for ac in all_acronyms_in_text if ac.lower() not in abbreviations]
+
+    # [PERF] Splice expansions between the recorded match spans
+    parts = []
+    last_end = 0
+    for start, end in spans:
+        acronym = text[start:end]
+        expansion = abbreviations.get(acronym.lower())
+        if expansion is None:
+            continue
+        parts.append(text[last_end:start])
+        parts.append(f"{expansion.title()} ({acronym})")
+        last_end = end
+    parts.append(text[last_end:])
+    expanded_text = "".join(parts)
 
     return expanded_text, sorted(final_unknown)
 
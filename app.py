@@ -9,17 +9,22 @@
 #   • Consistency Check (with AI-Powered Fixes)
 # -----------------------------------------------------
 
+import io
 import os
-from io import BytesIO
-from flask import Flask, request, jsonify, send_from_directory
+import hashlib
+import threading
+import zipfile
+from collections import OrderedDict
+from lxml import etree
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from docx import Document
 from dotenv import load_dotenv 
 # ---- Import local modules ----
 # We use "acroynom.py" to match the file I am providing
-from acroynom import load_abbreviations, expand_acronyms
+from acroynom import abbreviations_version, load_abbreviations, expand_acronyms
 # from citations import detect_citation_style, format_citation
-from rewrite_model import rewrite_section, rewrite_to_fix_conflicts
+from rewrite_model import rewrite_section, rewrite_section_stream, rewrite_to_fix_conflicts
 from consistency_model import analyze_cross_section
 
 # ---- Load Environment Variables ----
@@ -29,20 +34,128 @@ load_dotenv()
 # Flask Setup
 # -----------------------------------------------------
 app = Flask(__name__, static_folder="static", static_url_path="/static")
+app.json.sort_keys = False  # skip per-response key sorting
 CORS(app)
 
 # -----------------------------------------------------
 # DOCX to text helper
 # -----------------------------------------------------
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_BODY, _W_P, _W_R, _W_HYPERLINK = _W_NS + "body", _W_NS + "p", _W_NS + "r", _W_NS + "hyperlink"
+# Run children that contribute text, mirroring python-docx's Run.text
+_RUN_TEXT = {_W_NS + "tab": "\t", _W_NS + "ptab": "\t", _W_NS + "cr": "\n", _W_NS + "noBreakHyphen": "-"}
+
+def _run_text(run) -> str:
+    parts = []
+    for child in run:
+        if child.tag == _W_NS + "t":
+            parts.append(child.text or "")
+        elif child.tag == _W_NS + "br":
+            if child.get(_W_NS + "type") in (None, "textWrapping"):
+                parts.append("\n")
+        else:
+            parts.append(_RUN_TEXT.get(child.tag, ""))
+    return "".join(parts)
+
+def _iter_docx_paragraphs(stream):
+    """
+    Streams the text of each top-level paragraph from word/document.xml,
+    clearing parsed elements as it goes instead of building python-docx's DOM.
+    """
+    with zipfile.ZipFile(stream) as archive, archive.open("word/document.xml") as xml:
+        # Uploads are untrusted: never expand entities or fetch external DTDs,
+        # whatever the installed lxml's defaults are
+        for _, elem in etree.iterparse(
+            xml, events=("end",), tag=_W_P, resolve_entities=False, no_network=True
+        ):
+            parent = elem.getparent()
+            if parent is None or parent.tag != _W_BODY:
+                continue  # table cells / text boxes; python-docx skips these too
+            text = "".join(
+                _run_text(run)
+                for child in elem.iterchildren(_W_R, _W_HYPERLINK)
+                for run in ([child] if child.tag == _W_R else child.iterchildren(_W_R))
+            ).strip()
+            if text:
+                yield text
+            # Drop this paragraph and everything parsed before it
+            elem.clear()
+            while elem.getprevious() is not None:
+                del parent[0]
+
+def _seekable_stream(stream):
+    """
+    zipfile (and so python-docx) calls stream.seekable(), which Werkzeug's
+    SpooledTemporaryFile lacks before Python 3.11; such uploads are read
+    into memory (a .docx is already compressed, so this stays small).
+    """
+    if hasattr(stream, "seekable"):
+        return stream
+    stream.seek(0)
+    return io.BytesIO(stream.read())
+
 def docx_to_text(file_storage) -> str:
     """Converts a .docx file (from upload) into plain text."""
     try:
-        file_bytes = BytesIO(file_storage.read())
-        document = Document(file_bytes)
+        # Both parsers open the upload as a zip, so make it seekable once
+        stream = _seekable_stream(file_storage.stream)
+        try:
+            # [PERF] Constant-memory streaming parse of the document XML
+            return "\n\n".join(_iter_docx_paragraphs(stream))
+        except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError):
+            # Fall back to python-docx for files the streaming parser can't handle
+            stream.seek(0)
+            document = Document(stream)
+            return "\n\n".join(p.text.strip() for p in document.paragraphs if p.text.strip())
     finally:
         # Reset stream position for any future reads
         file_storage.stream.seek(0)
-    return "\n\n".join(p.text.strip() for p in document.paragraphs if p.text.strip())
+
+# -----------------------------------------------------
+# /process response cache
+# -----------------------------------------------------
+# Repeat clicks on the same text return the stored response instead of
+# re-running the models (expand entries also track the abbreviation file).
+# Pass ?nocache=1 to force a fresh run.
+RESPONSE_CACHE_SIZE = 512
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+def _response_cache_key(*parts) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.digest()
+
+def _response_cache_get(key):
+    with _response_cache_lock:
+        payload = _response_cache.get(key)
+        if payload is not None:
+            _response_cache.move_to_end(key)
+        return payload
+
+def _response_cache_put(key, payload):
+    with _response_cache_lock:
+        _response_cache[key] = payload
+        _response_cache.move_to_end(key)
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+def _is_cacheable(action, payload) -> bool:
+    """Skips responses that a retry could improve (API errors, unresolved acronyms)."""
+    if action == "expand":
+        return not payload["unknown"]
+    if action == "rewrite":
+        return not any(str(v).startswith("Error") for v in payload.values())
+    if action == "consistency":
+        if any(r.get("label") == "ERROR" for r in payload["consistency_results"]):
+            return False
+        suggested = payload["suggested_rewrite"]
+        if suggested is None:  # no issues, so no fix was requested
+            return True
+        return bool(suggested) and not suggested.startswith("Error")
+    return True
 
 # -----------------------------------------------------
 # Routes
@@ -64,26 +177,39 @@ def process():
         if not text:
             return jsonify({"error": "No text provided"}), 400
 
+        # [PERF] ?stream=1 sends the rewrite JSON as Gemini generates it, so
+        # the first characters arrive in a few hundred ms (not cached)
+        if action == "rewrite" and request.args.get("stream") == "1":
+            return Response(stream_with_context(rewrite_section_stream(text)), mimetype="text/plain")
+
+        # Expansions also depend on the abbreviation file, so an edit to it
+        # (or its log) starts a fresh cache entry
+        version = abbreviations_version() if action == "expand" else None
+        cache_key = _response_cache_key(action, style, text, version)
+        if request.args.get("nocache") != "1":
+            cached = _response_cache_get(cache_key)
+            if cached is not None:
+                return jsonify(cached)
+
         # ---------- Acronym Expansion ----------
         if action == "expand":
             # [FIX] This function only takes one argument
             expanded, unknown = expand_acronyms(text)
-            return jsonify({"result": expanded, "unknown": unknown})
+            payload = {"result": expanded, "unknown": unknown}
 
         # ---------- Citation Formatter ----------
         elif action == "citation":
             # Placeholder: Implement detect_citation_style and format_citation in citations.py
             # detected = detect_citation_style(text)
             # formatted = format_citation(style, text)
-            # return jsonify({"result": formatted, "detected": detected})
+            # payload = {"result": formatted, "detected": detected}
             print("Citation action called, but 'citations.py' is not implemented.")
-            return jsonify({"result": text, "detected": "N/A (Not Implemented)"})
+            payload = {"result": text, "detected": "N/A (Not Implemented)"}
 
         # ---------- Context-Aware Rewrite ----------
         elif action == "rewrite":
             # Calls the simple rewrite function
-            output = rewrite_section(text)
-            return jsonify(output)
+            payload = rewrite_section(text)
 
         # ---------- Cross-Section Consistency ----------
         elif action == "consistency":
@@ -105,14 +231,18 @@ def process():
             
             # 4. Return both the analysis AND the suggestion
             # The 'analysis' dict already contains 'consistency_results' and 'issues_report'
-            return jsonify({
+            payload = {
                 **analysis,
                 "suggested_rewrite": suggested_rewrite
-            })
+            }
 
         else:
             return jsonify({"error": f"Unknown action '{action}'"}), 400
 
+        if _is_cacheable(action, payload):
+            _response_cache_put(cache_key, payload)
+        return jsonify(payload)
+
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -138,7 +268,7 @@ def upload():
 # Run
 # -----------------------------------------------------
 if __name__ == "__main__":
-    # [FIX] Use app.run() which is the standard Flask (WSGI) server.
+    # [FIX] This is a WSGI app: serve it with waitress (or app.run() when DEV is set).
     # This replaces the Uvicorn (ASGI) server that was causing the TypeError.
     
     # Check for 'requests' library, as it's vital for API calls
@@ -151,4 +281,10 @@ if __name__ == "__main__":
         print("pip install requests")
         print("-------------------------------------------------------")
         
-    app.run(host="127.0.0.1", port=5001, debug=True)
\ No newline at end of file
+    if os.environ.get("DEV"):
+        # Flask's development server with the debugger and auto-reload
+        app.run(host="127.0.0.1", port=5001, debug=True)
+    else:
+        # [PERF] Multi-threaded WSGI server so slow Gemini calls don't block other requests
+        from waitress import serve
+        serve(app, host="127.0.0.1", port=5001, threads=16)
\ No newline at end of file
@@ -1,76 +1,103 @@
 import re
 
+# Citation style detection patterns (compiled once at import)
+_YEAR_PAREN_RE = re.compile(r"\(\d{4}\)")
+_IEEE_RE = re.compile(r"\[\d+\]")
+_VANCOUVER_RE = re.compile(r"^\d+\.")
+_YEAR_PAREN_END_RE = re.compile(r"\d{4}\)$")
+_FOOTNOTE_RE = re.compile(r"[¹²³]")
+_URL_RE = re.compile(r"https?://")
+_ISO_RE = re.compile(r"iso|iec|ieee")
+_REF_RE = re.compile(r"ref\.")
+
 def detect_citation_style(text: str) -> str:
     """Roughly detect the citation style by pattern."""
     t = text.strip()
+    t_lower = t.lower()
 
     # Academic styles
-    if re.search(r"\(\d{4}\)", t) and re.search(r"\.", t.split(")")[0]):
+    if _YEAR_PAREN_RE.search(t) and "." in t.split(")")[0]:
         return "apa"
-    if re.search(r"\[\d+\]", t):
+    if _IEEE_RE.search(t):
         return "ieee"
-    if re.match(r"^\d+\.", t):
+    if _VANCOUVER_RE.match(t):
         return "vancouver"
     if "et al." in t and '"' in t:
         return "mla"
-    if re.search(r"\(\d{4}\)", t) and t.count(",") >= 2:
+    if _YEAR_PAREN_RE.search(t) and t.count(",") >= 2:
         return "harvard"
-    if re.search(r"\d{4}\)$", t) and '"' in t:
+    if _YEAR_PAREN_END_RE.search(t) and '"' in t:
         return "chicago"
 
     # Business / corporate styles
-    if t.lower().startswith("according to"):
+    if t_lower.startswith("according to"):
         return "inline"
-    if re.search(r"¹|²|³", t):
+    if _FOOTNOTE_RE.search(t):
         return "footnote"
-    if re.search(r"https?://", t):
+    if _URL_RE.search(t):
         return "hyperlink"
-    if re.search(r"iso|iec|ieee", t.lower()):
+    if _ISO_RE.search(t_lower):
         return "iso"
-    if re.search(r"ref\.", t.lower()):
+    if _REF_RE.search(t_lower):
         return "internal"
 
     return "unknown"
 
 
+# Target style -> output template, filled from extract_core_info()
+_CITATION_TEMPLATES = {
+    "apa": "{author} ({year}). {title}. {source}.",
+    "ieee": "{author}, \"{title},\" {source}, {year}.",
+    "mla": "{author}. \"{title}.\" {source}, {year}.",
+    "chicago": "{author}. \"{title}.\" {source} ({year}).",
+    "harvard": "{author} ({year}) {title}. {source}.",
+    "inline": "According to {author} ({year}), {title}.",
+    "footnote": "¹ {author} ({year}), {title}, {source}.",
+    "hyperlink": "{title} — [Source]({url}) ({year})",
+    "iso": "ISO/IEC {source}: {title} ({year}).",
+    "internal": "Ref. No. {source} — {title} ({year})",
+}
+
 def format_citation(style: str, text: str) -> str:
     """Convert text into chosen style (mock transformation)."""
-    style = style.lower()
-    base_info = extract_core_info(text)
+    template = _CITATION_TEMPLATES.get(style.lower())
+    if template is None:
+        return text
+    return template.format_map(extract_core_info(text))
 
-    if style == "apa":
-        return f"{base_info['author']} ({base_info['year']}). {base_info['title']}. {base_info['source']}."
-    if style == "ieee":
-        return f"{base_info['author']}, \"{base_info['title']},\" {base_info['source']}, {base_info['year']}."
-    if style == "mla":
-        return f"{base_info['author']}. \"{base_info['title']}.\" {base_info['source']}, {base_info['year']}."
-    if style == "chicago":
-        return f"{base_info['author']}. \"{base_info['title']}.\" {base_info['source']} ({base_info['year']})."
-    if style == "harvard":
-        return f"{base_info['author']} ({base_info['year']}) {base_info['title']}. {base_info['source']}."
-    if style == "inline":
-        return f"According to {base_info['author']} ({base_info['year']}), {base_info['title']}."
-    if style == "footnote":
-        return f"¹ {base_info['author']} ({base_info['year']}), {base_info['title']}, {base_info['source']}."
-    if style == "hyperlink":
-        return f"{base_info['title']} — [Source]({base_info['url']}) ({base_info['year']})"
-    if style == "iso":
-        return f"ISO/IEC {base_info['source']}: {base_info['title']} ({base_info['year']})."
-    if style == "internal":
-        return f"Ref. No. {base_info['source']} — {base_info['title']} ({base_info['year']})"
-    return text
+# Core-info extraction patterns. The inline author and the year can never
+# overlap, so they share one scan; title and URL spans may contain a year
+# and are kept as separate searches.
+_AUTHOR_YEAR_RE = re.compile(r"According to (?P<author>[A-Za-z& ]+)|\(?(?P<year>\d{4})\)?")
+_LEADING_FIELD_RE = re.compile(r"[,.\(]")
+_TITLE_RE = re.compile(r"[,\"“”']\s*([^\"“”']+)[\"“”']")
+_SOURCE_RE = re.compile(r"\b([A-Z][A-Za-z0-9&\- ]+)\b")
+_URL_CAPTURE_RE = re.compile(r"(https?://[^\s]+)")
 
 def extract_core_info(text: str):
     """Extract key components for cross-format conversion."""
-    author_match = re.search(r"According to ([A-Za-z& ]+)", text)
-    author = author_match.group(1).strip() if author_match else re.split(r"[,.\(]", text)[0].strip()
-    year_match = re.search(r"\(?(\d{4})\)?", text)
-    year = year_match.group(1) if year_match else "n.d."
-    title_match = re.search(r"[,\"“”']\s*([^\"“”']+)[\"“”']", text)
+    author = year = None
+    source_start = None
+    for m in _AUTHOR_YEAR_RE.finditer(text):
+        if m.lastgroup == "author":
+            if author is None:
+                author = m.group("author").strip()
+        elif year is None:
+            year, source_start = m.group("year"), m.end()
+        if author is not None and year is not None:
+            break
+    if author is None:
+        author = _LEADING_FIELD_RE.split(text, 1)[0].strip()
+    if year is None:
+        year = "n.d."
+        if year in text:
+            source_start = text.rindex(year) + len(year)
+    title_match = _TITLE_RE.search(text)
     title = title_match.group(1) if title_match else "Untitled"
-    source_match = re.search(r"\b([A-Z][A-Za-z0-9&\- ]+)\b", text.split(year)[-1]) if year in text else None
+    # The source follows the first year match (split(year)[-1] used the last one)
+    source_match = _SOURCE_RE.search(text[source_start:]) if source_start is not None else None
     source = source_match.group(1).strip() if source_match else "Unknown Source"
-    url_match = re.search(r"(https?://[^\s]+)", text)
+    url_match = _URL_CAPTURE_RE.search(text)
     url = url_match.group(1) if url_match else "https://example.com"
     return {"author": author, "year": year, "title": title, "source": source, "url": url}
 
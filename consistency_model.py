@@ -5,24 +5,70 @@
 # - Smart context checking for numbers
 # -----------------------------------------
 
+import hashlib
+import json
+import os
 import re
-import nltk
-from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
 from itertools import combinations # <-- Correctly checks all pairs
-from nltk.corpus import wordnet
 import numpy as np
 
-# Download required NLTK components
-nltk.download("punkt", quiet=True)
-nltk.download("wordnet", quiet=True)
-nltk.download("averaged_perceptron_tagger", quiet=True)
-nltk.download("punkt_tab", quiet=True) 
+try:
+    import ahocorasick  # pyahocorasick: one-pass multi-term context matching
+except ImportError:
+    ahocorasick = None
+
+try:
+    from sentence_transformers import SentenceTransformer  # bi-encoder prescreen
+except ImportError:
+    SentenceTransformer = None
+
+try:
+    from optimum.onnxruntime import ORTModelForSequenceClassification  # int8 ONNX model
+except ImportError:
+    ORTModelForSequenceClassification = None
+
+try:
+    import diskcache  # persistent NLI verdict cache
+except ImportError:
+    diskcache = None
 
 # Load lightweight DistilBERT NLI model
 MODEL_NAME = "typeform/distilbert-base-uncased-mnli"
+# Written by scripts/export_onnx.py; used instead of the FP32 model when present
+ONNX_MODEL_DIR = "onnx"
+ONNX_MODEL_FILE = "model-int8.onnx"
+
+USE_CUDA = torch.cuda.is_available()
+
 tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
-nli_pipeline = pipeline("text-classification", model=model, tokenizer=tokenizer)
+if ORTModelForSequenceClassification is not None and os.path.exists(os.path.join(ONNX_MODEL_DIR, ONNX_MODEL_FILE)):
+    # [PERF] Dynamically quantized int8 weights run 2-4x faster on CPU
+    model = ORTModelForSequenceClassification.from_pretrained(ONNX_MODEL_DIR, file_name=ONNX_MODEL_FILE)
+    nli_variant = "onnx-int8"
+else:
+    # [PERF] FP16 weights on the GPU: half the memory traffic, tensor cores
+    model = AutoModelForSequenceClassification.from_pretrained(
+        MODEL_NAME, torch_dtype=torch.float16 if USE_CUDA else torch.float32,
+    ).to("cuda" if USE_CUDA else "cpu").eval()
+    nli_variant = "fp16" if USE_CUDA else "fp32"
+# Sentence pairs per forward pass in analyze_cross_section
+NLI_BATCH_SIZE = 32
+
+# Verdicts per (premise, hypothesis) persist across restarts, so re-checking
+# an edited document only runs the model on pairs with a changed sentence
+NLI_CACHE_DIR = ".nli_cache"
+nli_cache = (
+    diskcache.Cache(NLI_CACHE_DIR, eviction_policy="least-recently-used")
+    if diskcache is not None else None
+)
+
+# Optional bi-encoder: sentences are embedded once and only pairs above this
+# cosine similarity are sent to the (much more expensive) NLI cross-encoder
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+SIMILARITY_THRESHOLD = 0.5
+embedder = SentenceTransformer(EMBEDDING_MODEL_NAME) if SentenceTransformer is not None else None
 
 # --------------------------
 # Global Context Dictionary
@@ -45,136 +91,287 @@ CONTEXTS = {
     }
 }
 
+# WordNet synonyms per keyword, frozen by scripts/build_contexts.py so startup
+# doesn't have to load the WordNet corpus
+CONTEXT_SYNONYMS_FILE = "context_synonyms.json"
+
+def load_frozen_synonyms(file_path=CONTEXT_SYNONYMS_FILE) -> dict:
+    """Loads the keyword -> synonyms lookup, or {} if it hasn't been built."""
+    if not os.path.exists(file_path):
+        return {}
+    with open(file_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
 def get_synonyms(word):
     """Get synonyms for a word using WordNet."""
+    from nltk.corpus import wordnet  # only needed for keywords missing from the frozen file
     synonyms = set()
     for syn in wordnet.synsets(word):
         for lemma in syn.lemmas():
             synonyms.add(lemma.name().lower())
     return synonyms
 
+# Built by initialize_contexts(): context bitmask per lowercased term, and
+# either an Aho-Corasick automaton over the terms or a fused number+term regex
+_term_masks = {}
+_context_automaton = None
+_feature_re = None
+
 def initialize_contexts():
     """Populates the global CONTEXTS dictionary with synonyms."""
-    global CONTEXTS
+    global CONTEXTS, _term_masks, _context_automaton, _feature_re
+    # [PERF] Use the frozen lookup; only keywords added since it was built
+    # fall back to WordNet
+    frozen = load_frozen_synonyms()
+    if any(k not in frozen for context_data in CONTEXTS.values() for k in context_data["keywords"]):
+        import nltk
+        nltk.download("wordnet", quiet=True)
     for context_data in CONTEXTS.values():
         for keyword in context_data["keywords"]:
-            context_data["synonyms"].update(get_synonyms(keyword))
+            synonyms = frozen.get(keyword)
+            context_data["synonyms"].update(synonyms if synonyms is not None else get_synonyms(keyword))
+        # Flattened once, deduplicated, in a stable order
+        context_data["all_terms"] = tuple(dict.fromkeys(
+            [*context_data["units"], *context_data["keywords"], *sorted(context_data["synonyms"])]
+        ))
+
+    # [PERF] Compile every context term once instead of substring-scanning
+    # each sentence for hundreds of WordNet terms
+    term_masks = {}
+    for bit, context_data in enumerate(CONTEXTS.values()):
+        for term in context_data["all_terms"]:
+            term_masks[term.lower()] = term_masks.get(term.lower(), 0) | (1 << bit)
+
+    if ahocorasick is not None:
+        _term_masks = term_masks
+        _context_automaton = ahocorasick.Automaton()
+        for term, mask in term_masks.items():
+            _context_automaton.add_word(term, mask)
+        _context_automaton.make_automaton()
+        _feature_re = _NUM_RE
+    else:
+        # [PERF] One finditer pass yields both numbers and context terms.
+        # Terms sit in a lookahead so overlapping terms are still found, and
+        # the longest term wins at each position, so it also carries the
+        # masks of any shorter terms it starts with.
+        terms = sorted(term_masks, key=len, reverse=True)
+        _term_masks = {}
+        for term in terms:
+            mask = 0
+            for prefix in terms:
+                if term.startswith(prefix):
+                    mask |= term_masks[prefix]
+            _term_masks[term] = mask
+        _feature_re = re.compile(
+            _NUM_PATTERN + r"|(?=(?P<term>" + "|".join(map(re.escape, terms)) + "))"
+        )
 
 # --------------------------
 # Utility functions
 # --------------------------
 
+# [PERF] Replaces nltk.sent_tokenize: one linear-time split after .!? (and
+# an optional closing quote/bracket) before a capital, digit, currency sign,
+# quote or bracket, with no Punkt model to load (Punkt also has a known ReDoS).
+# Common abbreviations don't end a sentence.
+_NON_TERMINAL_ABBREVIATIONS = ("Dr.", "Mr.", "Mrs.", "Ms.", "Prof.", "Jr.", "Sr.", "St.", "vs.", "e.g.", "i.e.", "U.S.")
+_SENTENCE_BOUNDARY_RE = re.compile(
+    r"(?:(?<=[.!?])"
+    + "".join(rf"(?<!\b{re.escape(abbr)})" for abbr in _NON_TERMINAL_ABBREVIATIONS)
+    + r"|(?<=[.!?][\"'”’)]))\s+(?=[A-Z0-9\"'“‘$€£(])"
+)
+
 def split_into_sentences(text: str):
     """Tokenize text into clean, unique sentences with context."""
-    sentences = nltk.sent_tokenize(text)
-    return [s.strip() for s in sentences if s.strip()]
-
-def convert_to_number(text):
-    """Convert written numbers and numeric strings to float values."""
-    number_words = {
-        'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
-        'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10,
-        'hundred': 100, 'thousand': 1000, 'million': 1000000, 'billion': 1000000000
-    }
-    
-    text = text.lower().strip()
-    if text in number_words:
-        return float(number_words[text])
-    try:
-        text = text.replace('$', '').replace('€', '').replace('£', '').replace(',', '')
-        if '%' in text:
-            return float(text.replace('%', '')) / 100
-        return float(text)
-    except ValueError:
-        return None
-
-def detect_numeric_mismatch(sent1: str, sent2: str) -> dict:
+    return [s.strip() for s in _SENTENCE_BOUNDARY_RE.split(text) if s.strip()]
+
+# [PERF] Currency symbol and percent sign get their own groups, so a match
+# is parsed without a separate stripping pass. Currency and percentages
+# come first so "$50,000" or "15%" is read as a single token rather than
+# also matching as a bare number.
+_NUM_PATTERN = (
+    r"(?P<cur>[$€£])(?P<amount>\d+(?:,\d{3})*(?:\.\d+)?)"  # Currency amounts
+    r"|(?P<pct>\d+(?:\.\d+)?)%"                           # Percentages
+    r"|(?P<num>\d+(?:,\d{3})*(?:\.\d+)?)"                # Regular numbers with commas
+)
+_NUM_RE = re.compile(_NUM_PATTERN)
+
+def _extract_features(sentence: str) -> dict:
+    """
+    Numbers and context flags for one sentence, computed once and reused
+    for every pair it appears in. "nums" holds floats, so "1,000" and
+    "$1000" compare equal; bit i of "ctx" is set when the sentence
+    mentions a term of the i-th context in CONTEXTS.
+    """
+    lowered = sentence.lower()
+    nums, ctx = set(), 0
+    for match in _feature_re.finditer(lowered):
+        kind = match.lastgroup
+        if kind == "term":
+            ctx |= _term_masks[match.group("term")]
+        elif kind == "amount":
+            # The symbol was consumed by the number, so credit its context here
+            nums.add(float(match.group("amount").replace(",", "")))
+            ctx |= _term_masks.get(match.group("cur"), 0)
+        elif kind == "pct":
+            nums.add(float(match.group("pct")) / 100)
+            ctx |= _term_masks.get("%", 0)
+        else:
+            nums.add(float(match.group("num").replace(",", "")))
+
+    if _context_automaton is not None:
+        for _, mask in _context_automaton.iter(lowered):
+            ctx |= mask
+    return {"nums": frozenset(nums), "ctx": ctx}
+
+def detect_numeric_mismatch(feats1: dict, feats2: dict) -> dict:
     """Enhanced numeric inconsistency detection with context awareness."""
-    patterns = [
-        r"(\d+(?:,\d{3})*(?:\.\d+)?)",  # Regular numbers with commas
-        r"(\d+(?:\.\d+)?%)",             # Percentages
-        r"(\$\d+(?:,\d{3})*(?:\.\d+)?)", # Dollar amounts
-        r"(€\d+(?:,\d{3})*(?:\.\d+)?)",  # Euro amounts
-        r"(£\d+(?:,\d{3})*(?:\.\d+)?)",  # Pound amounts
-    ]
-    
-    nums1, nums2 = [], []
-    for pattern in patterns:
-        nums1.extend(re.findall(pattern, sent1, re.IGNORECASE))
-        nums2.extend(re.findall(pattern, sent2, re.IGNORECASE))
-    
-    nums1_conv = [str(convert_to_number(n)) for n in nums1 if convert_to_number(n) is not None]
-    nums2_conv = [str(convert_to_number(n)) for n in nums2 if convert_to_number(n) is not None]
-    
-    if not nums1_conv or not nums2_conv:
+    nums1, nums2 = feats1["nums"], feats2["nums"]
+    if not nums1 or not nums2:
         return {"mismatch": False, "reason": "No numbers to compare"}
-    
-    for context_name, context_data in CONTEXTS.items():
-        all_terms = context_data["units"] + context_data["keywords"] + list(context_data["synonyms"])
-        sent1_has_context = any(term.lower() in sent1.lower() for term in all_terms)
-        sent2_has_context = any(term.lower() in sent2.lower() for term in all_terms)
-        
-        if sent1_has_context and sent2_has_context and set(nums1_conv) != set(nums2_conv):
-            return {
-                "mismatch": True,
-                "reason": f"Numeric mismatch in {context_name} context: {set(nums1_conv)} vs {set(nums2_conv)}"
-            }
+
+    shared = feats1["ctx"] & feats2["ctx"]
+    if shared and nums1 != nums2:
+        # Report the first context both sentences share
+        context_name = list(CONTEXTS)[(shared & -shared).bit_length() - 1]
+        return {
+            "mismatch": True,
+            "reason": f"Numeric mismatch in {context_name} context: {set(nums1)} vs {set(nums2)}"
+        }
 
     return {"mismatch": False, "reason": "No contextual numeric mismatch detected"}
 
+def _build_result(sentence1: str, sentence2: str, label: str, score: float, numeric_result: dict) -> dict:
+    """Combines the NLI label and the numeric analysis into one verdict."""
+    response = {
+        "sentence1": sentence1,
+        "sentence2": sentence2,
+        "confidence": round(score, 3),
+        "numeric_analysis": numeric_result
+    }
+    
+    if numeric_result["mismatch"]:
+        response.update({
+            "verdict": "❌ Numeric Mismatch",
+            "label": "CONTRADICTION",
+            "suggestion": f"Inconsistency detected: {numeric_result['reason']}"
+        })
+    elif label == "CONTRADICTION":
+        response.update({
+            "verdict": "❌ Logical Contradiction",
+            "label": "CONTRADICTION",
+            "suggestion": "These statements express conflicting information."
+        })
+    elif label == "ENTAILMENT":
+        response.update({
+            "verdict": "✅ Consistent",
+            "label": "ENTAILMENT",
+            "suggestion": "Statements are logically and numerically consistent."
+        })
+    else:
+        response.update({
+            "verdict": "⚪ Neutral",
+            "label": "NEUTRAL",
+            "suggestion": "No clear logical relation or numeric inconsistency detected."
+        })
+    
+    return response
+
+def _error_result(sentence1: str, sentence2: str, error: Exception) -> dict:
+    return {
+        "sentence1": sentence1,
+        "sentence2": sentence2,
+        "verdict": f"⚠️ Error: {error}",
+        "label": "ERROR",
+        "confidence": 0.0,
+        "suggestion": "Check input formatting or model initialization.",
+        "numeric_analysis": {"mismatch": False, "reason": "Error in analysis"}
+    }
+
+def _truncate_pair(ids1: list, ids2: list, max_tokens: int):
+    """Longest-first truncation, matching the tokenizer's truncation=True."""
+    if len(ids1) + len(ids2) <= max_tokens:
+        return ids1, ids2
+    # [PERF] Final lengths worked out directly, then one slice each. As in the
+    # Rust tokenizer, the longer side keeps the odd token (ids2 on a tie).
+    half = (max_tokens + 1) // 2
+    if len(ids1) > len(ids2):
+        len1 = min(len(ids1), max(half, max_tokens - len(ids2)))
+        return ids1[:len1], ids2[:max_tokens - len1]
+    len2 = min(len(ids2), max(half, max_tokens - len(ids1)))
+    return ids1[:max_tokens - len2], ids2[:len2]
+
+def _nli_batch(sentences: list, index_pairs: list) -> list:
+    """
+    Runs NLI over (i, j) pairs of sentence indices and returns one
+    {"label", "score"} per pair (top label after softmax).
+    [PERF] Calls the model directly: no pipeline pre/post-processing.
+    """
+    if not index_pairs:
+        return []
+    # [PERF] Tokenize each sentence once; the pairs only splice cached ids
+    cached = tokenizer(sentences, add_special_tokens=False, verbose=False)["input_ids"]
+    # [CLS] a [SEP] b [SEP] for BERT-style models; RoBERTa-style models
+    # use two separators in the middle, hence the count from the tokenizer
+    n_special = tokenizer.num_special_tokens_to_add(pair=True)
+    cls, sep = [tokenizer.cls_token_id], [tokenizer.sep_token_id]
+    middle = sep * (n_special - 2)
+    max_tokens = min(tokenizer.model_max_length, model.config.max_position_embeddings) - n_special
+    with_token_types = "token_type_ids" in tokenizer.model_input_names
+    id2label = model.config.id2label
+
+    results = []
+    for start in range(0, len(index_pairs), NLI_BATCH_SIZE):
+        features = []
+        for i, j in index_pairs[start:start + NLI_BATCH_SIZE]:
+            ids1, ids2 = _truncate_pair(cached[i], cached[j], max_tokens)
+            first = cls + ids1 + middle
+            feature = {"input_ids": first + ids2 + sep}
+            if with_token_types:
+                feature["token_type_ids"] = [0] * len(first) + [1] * (len(ids2) + 1)
+            features.append(feature)
+
+        inputs = tokenizer.pad(features, return_tensors="pt").to(model.device)
+        with torch.inference_mode(), torch.autocast("cuda", dtype=torch.float16, enabled=USE_CUDA):
+            logits = model(**inputs).logits
+        # Softmax in FP32 so FP16 logits don't lose precision in the scores
+        probs = logits.float().softmax(dim=-1)
+        scores, label_ids = probs.max(dim=-1)
+        results.extend(
+            {"label": id2label[label_id], "score": score}
+            for label_id, score in zip(label_ids.tolist(), scores.tolist())
+        )
+    return results
+
+def _nli_cached(sentences: list, index_pairs: list) -> list:
+    """_nli_batch, answering pairs seen before from the on-disk cache."""
+    if nli_cache is None:
+        return _nli_batch(sentences, index_pairs)
+
+    # Keys are ordered: NLI is asymmetric, so (a, b) and (b, a) differ.
+    # The model and its precision are part of the key because scores differ.
+    hashes = [hashlib.sha1(s.encode("utf-8")).hexdigest() for s in sentences]
+    keys = [f"{MODEL_NAME}:{nli_variant}:{hashes[i]}:{hashes[j]}" for i, j in index_pairs]
+    results = [nli_cache.get(key) for key in keys]
+    misses = [k for k, result in enumerate(results) if result is None]
+    if misses:
+        computed = _nli_batch(sentences, [index_pairs[k] for k in misses])
+        with nli_cache.transact():
+            for k, result in zip(misses, computed):
+                results[k] = nli_cache[keys[k]] = result
+    return results
+
 def check_consistency(sentence1: str, sentence2: str) -> dict:
     """Enhanced consistency checker."""
     try:
-        numeric_result = detect_numeric_mismatch(sentence1, sentence2)
-        combined_input = f"{sentence1} </s> {sentence2}"
-        nli_result = nli_pipeline(combined_input)[0]
-        label = nli_result["label"]
-        score = round(nli_result["score"], 3)
-        
-        response = {
-            "sentence1": sentence1,
-            "sentence2": sentence2,
-            "confidence": score,
-            "numeric_analysis": numeric_result
-        }
-        
-        if numeric_result["mismatch"]:
-            response.update({
-                "verdict": "❌ Numeric Mismatch",
-                "label": "CONTRADICTION",
-                "suggestion": f"Inconsistency detected: {numeric_result['reason']}"
-            })
-        elif label == "CONTRADICTION":
-            response.update({
-                "verdict": "❌ Logical Contradiction",
-                "label": "CONTRADICTION",
-                "suggestion": "These statements express conflicting information."
-            })
-        elif label == "ENTAILMENT":
-            response.update({
-                "verdict": "✅ Consistent",
-                "label": "ENTAILMENT",
-                "suggestion": "Statements are logically and numerically consistent."
-            })
-        else:
-            response.update({
-                "verdict": "⚪ Neutral",
-                "label": "NEUTRAL",
-                "suggestion": "No clear logical relation or numeric inconsistency detected."
-            })
-        
-        return response
-            
+        numeric_result = detect_numeric_mismatch(_extract_features(sentence1), _extract_features(sentence2))
+        nli_result = _nli_batch([sentence1, sentence2], [(0, 1)])[0]
+        return _build_result(sentence1, sentence2, nli_result["label"], nli_result["score"], numeric_result)
     except Exception as e:
-        return {
-            "sentence1": sentence1,
-            "sentence2": sentence2,
-            "verdict": f"⚠️ Error: {e}",
-            "label": "ERROR",
-            "confidence": 0.0,
-            "suggestion": "Check input formatting or model initialization.",
-            "numeric_analysis": {"mismatch": False, "reason": "Error in analysis"}
-        }
+        return _error_result(sentence1, sentence2, e)
+
+# One report entry per issue: the reason, then the two sentences
+_issue_line = '- {}\n  "{}" vs.\n  "{}"'.format
 
 def analyze_cross_section(document_text: str):
     """Analyzes all pairs of sentences for inconsistencies."""
@@ -183,15 +380,41 @@ def analyze_cross_section(document_text: str):
     if len(sentences) < 2:
         return {"consistency_results": [], "issues_report": "ℹ️ Not enough text to check."}
         
-    results, contradictions = [], []
-    
     # [FIX] Use combinations to check ALL pairs
-    for sent1, sent2 in combinations(sentences, 2):
-        result = check_consistency(sent1, sent2)
-        results.append(result)
-        if (result["label"] == "CONTRADICTION" or 
-            (result.get("numeric_analysis", {}).get("mismatch", False))):
-            contradictions.append(result)
+    index_pairs = list(combinations(range(len(sentences)), 2))
+    pairs = [(sentences[i], sentences[j]) for i, j in index_pairs]
+    # [PERF] Numbers and context flags once per sentence, not once per pair
+    feats = [_extract_features(s) for s in sentences]
+    try:
+        # [PERF] Only pairs that share a context or both carry numbers go
+        # through the model; the rest are reported as Neutral without a
+        # forward pass (they can never produce a numeric mismatch either)
+        candidates = [
+            k for k, (i, j) in enumerate(index_pairs)
+            if feats[i]["ctx"] & feats[j]["ctx"] or (feats[i]["nums"] and feats[j]["nums"])
+        ]
+        if embedder is not None:
+            # [PERF] One bi-encoder pass per sentence and a single matmul;
+            # dissimilar pairs are unlikely to entail or contradict
+            emb = embedder.encode(sentences, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+            sim = emb @ emb.T
+            candidates = [k for k in candidates if sim[index_pairs[k]] > SIMILARITY_THRESHOLD]
+        nli_results = [{"label": "NEUTRAL", "score": 0.0}] * len(index_pairs)
+        # [PERF] Batched forward passes instead of one per pair
+        for k, nli in zip(candidates, _nli_cached(sentences, [index_pairs[k] for k in candidates])):
+            nli_results[k] = nli
+        numeric_results = [detect_numeric_mismatch(feats[i], feats[j]) for i, j in index_pairs]
+        results = [
+            _build_result(s1, s2, nli["label"], nli["score"], numeric)
+            for (s1, s2), nli, numeric in zip(pairs, nli_results, numeric_results)
+        ]
+    except Exception as e:
+        results = [_error_result(s1, s2, e) for s1, s2 in pairs]
+
+    contradictions = [
+        r for r in results
+        if r["label"] == "CONTRADICTION" or r.get("numeric_analysis", {}).get("mismatch", False)
+    ]
 
     if contradictions:
         summary_lines = ["⚠️ Inconsistencies detected:"]
@@ -201,15 +424,15 @@ def analyze_cross_section(document_text: str):
         
         if numeric_issues:
             summary_lines.append("\n🔢 Numeric Inconsistencies:")
-            for issue in numeric_issues:
-                line = f"- {issue['numeric_analysis']['reason']}\n  \"{issue['sentence1']}\" vs.\n  \"{issue['sentence2']}\""
-                summary_lines.append(line)
+            summary_lines.extend(
+                _issue_line(i["numeric_analysis"]["reason"], i["sentence1"], i["sentence2"]) for i in numeric_issues
+            )
         
         if logical_issues:
             summary_lines.append("\n❌ Logical Contradictions:")
-            for issue in logical_issues:
-                line = f"- {issue['suggestion']}\n  \"{issue['sentence1']}\" vs.\n  \"{issue['sentence2']}\""
-                summary_lines.append(line)
+            summary_lines.extend(
+                _issue_line(i["suggestion"], i["sentence1"], i["sentence2"]) for i in logical_issues
+            )
                 
         summary = "\n".join(summary_lines)
     else:
@@ -1,7 +1,21 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import hashlib
 import json
-import time
+import re
 import os
+
+try:
+    import orjson  # faster parsing of the model's JSON replies
+except ImportError:
+    orjson = None
+
+try:
+    import diskcache  # persistent cache of Gemini replies
+except ImportError:
+    diskcache = None
+
 # from transformers import AutoTokenizer, AutoModelForSeq2SeqLM # <-- T5 Model REMOVED
 
 # -----------------------------------------------------------------
@@ -10,21 +24,97 @@ import os
 # and avoids the "True" bug.
 # -----------------------------------------------------------------
 
+GEMINI_MODEL_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-09-2025"
+GEMINI_API_URL = f"{GEMINI_MODEL_URL}:generateContent"
+GEMINI_STREAM_URL = f"{GEMINI_MODEL_URL}:streamGenerateContent?alt=sse"
+GEMINI_TIMEOUT = 30  # seconds
+# Appended to a streamed reply that broke off, so clients can tell it from a complete one
+STREAM_INTERRUPTED = "\nError: Stream interrupted; the reply above is incomplete."
+
+# Retries connection errors and 429/5xx replies with exponential backoff,
+# honouring Retry-After; jitter keeps concurrent clients from retrying in step
+_RETRY_SETTINGS = dict(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["POST"],
+    respect_retry_after_header=True,
+    raise_on_status=False,  # hand back the last error response instead of raising
+)
+try:
+    GEMINI_RETRY = Retry(backoff_jitter=0.5, **_RETRY_SETTINGS)
+except TypeError:  # urllib3 < 2 has no backoff_jitter
+    GEMINI_RETRY = Retry(**_RETRY_SETTINGS)
+
+# [PERF] One pooled keep-alive session: back-to-back rewrite and fix-conflict
+# calls reuse the TLS connection instead of handshaking every time
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=GEMINI_RETRY))
+SESSION.headers.update({"Content-Type": "application/json"})
+
+# [PERF] Successful rewrites/fixes are kept on disk for a day, so the same
+# text doesn't cost another 1-3 s round-trip (or API quota) after a restart
+REWRITE_CACHE_DIR = ".rewrite_cache"
+REWRITE_CACHE_TTL = 24 * 60 * 60  # seconds
+rewrite_cache = diskcache.Cache(REWRITE_CACHE_DIR) if diskcache is not None else None
+
+def _cache_key(kind: str, *parts: str) -> str:
+    return f"{kind}:" + hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
 # -----------------------------------------------------------------
-# Gemini API call (for fixing conflicts AND rewrites)
+# Static prompts and schemas (built once at import, reused per call)
 # -----------------------------------------------------------------
-def call_gemini_api(system_prompt: str, user_prompt: str, response_schema=None) -> str:
+REWRITE_SYSTEM_PROMPT = (
+    "You are an expert editor. The user will provide text. "
+    "You must generate three distinct rewrites: "
+    "1. professional: Formal, corporate, and polished. "
+    "2. concise: As short as possible while keeping the core meaning. "
+    "3. simpler: Easy to understand, avoids jargon. "
+    "You must respond *only* with a JSON object."
+)
+
+# The JSON schema we want the model to return for rewrites
+REWRITE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "original": { "type": "STRING" },
+        "professional": { "type": "STRING" },
+        "concise": { "type": "STRING" },
+        "simpler": { "type": "STRING" }
+    },
+    "propertyOrdering": ["original", "professional", "concise", "simpler"]
+}
+
+FIX_CONFLICTS_SYSTEM_PROMPT = (
+    "You are an expert document editor. Your task is to rewrite a piece of text to resolve a specific list of "
+    "detected contradictions. You must produce a single, clean, and professionally written block of text "
+    "that is logically consistent. Do not just comment on the errors; fix them."
+)
+
+# A ```json ... ``` fenced block, in case the model wraps its JSON reply
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*\}|\[.*\])\s*```", re.S)
+
+def extract_json(text: str):
     """
-    Calls the Gemini API with a specific system and user prompt.
-    Returns the generated text. Can be configured to return JSON.
+    Parses a JSON reply from the model, tolerating Markdown code fences.
+    Returns None if no valid JSON is found.
     """
-    apiKey = os.getenv("GEMINI_API_KEY")
-    if not apiKey:
-        print("ERROR: GEMINI_API_KEY environment variable not set.")
-        return "Error: API key not configured on server. Please set GEMINI_API_KEY in .env file."
+    text = text.strip()
+    # Fast path: schema-constrained replies are bare JSON
+    if not text.startswith(("{", "[")):
+        match = _JSON_FENCE_RE.search(text)
+        if not match:
+            return None
+        text = match.group(1)
+    try:
+        return orjson.loads(text) if orjson is not None else json.loads(text)
+    except json.JSONDecodeError:  # orjson.JSONDecodeError subclasses this
+        return None
 
-    apiUrl = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-09-2025:generateContent?key={apiKey}"
-    
+# -----------------------------------------------------------------
+# Gemini API call (for fixing conflicts AND rewrites)
+# -----------------------------------------------------------------
+def _gemini_payload(system_prompt: str, user_prompt: str, response_schema=None) -> dict:
     payload = {
         "contents": [{ "parts": [{ "text": user_prompt }] }],
         "systemInstruction": {
@@ -38,80 +128,122 @@ def call_gemini_api(system_prompt: str, user_prompt: str, response_schema=None)
             "responseMimeType": "application/json",
             "responseSchema": response_schema
         }
+    return payload
 
-    max_retries = 3
-    delay = 1
-    for attempt in range(max_retries):
-        try:
-            response = requests.post(apiUrl, json=payload, headers={'Content-Type': 'application/json'})
-            
-            if response.status_code == 200:
-                result = response.json()
-                text_part = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-                return text_part.strip()
-            else:
+def _candidate_text(result: dict) -> str:
+    return result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
+
+def call_gemini_api(system_prompt: str, user_prompt: str, response_schema=None) -> str:
+    """
+    Calls the Gemini API with a specific system and user prompt.
+    Returns the generated text. Can be configured to return JSON.
+    """
+    apiKey = os.getenv("GEMINI_API_KEY")
+    if not apiKey:
+        print("ERROR: GEMINI_API_KEY environment variable not set.")
+        return "Error: API key not configured on server. Please set GEMINI_API_KEY in .env file."
+
+    payload = _gemini_payload(system_prompt, user_prompt, response_schema)
+
+    try:
+        # Key in a header rather than the URL, so it stays out of logs
+        response = SESSION.post(
+            GEMINI_API_URL,
+            json=payload,
+            headers={"x-goog-api-key": apiKey},
+            timeout=GEMINI_TIMEOUT,
+        )
+    except requests.RequestException as e:
+        print(f"Request failed after retries: {e}")
+        return "Error: Unable to generate rewrite."
+
+    if response.status_code != 200:
+        print(f"API Error: Status {response.status_code}, Response: {response.text}")
+        return "Error: Unable to generate rewrite."
+
+    try:
+        return _candidate_text(response.json()).strip()
+    except (ValueError, IndexError, AttributeError) as e:  # non-JSON body, empty candidates
+        print(f"Unexpected API response: {e}, Response: {response.text[:500]}")
+        return "Error: Unable to generate rewrite."
+
+def stream_gemini_api(system_prompt: str, user_prompt: str, response_schema=None):
+    """
+    Like call_gemini_api, but yields the generated text in chunks as the
+    model produces them (server-sent events from streamGenerateContent).
+    Yields a single error string if the call fails before any text arrives,
+    and STREAM_INTERRUPTED as a last chunk if it fails part-way through.
+    """
+    apiKey = os.getenv("GEMINI_API_KEY")
+    if not apiKey:
+        print("ERROR: GEMINI_API_KEY environment variable not set.")
+        yield "Error: API key not configured on server. Please set GEMINI_API_KEY in .env file."
+        return
+
+    payload = _gemini_payload(system_prompt, user_prompt, response_schema)
+    sent_any = False
+    try:
+        with SESSION.post(
+            GEMINI_STREAM_URL,
+            json=payload,
+            headers={"x-goog-api-key": apiKey},
+            timeout=GEMINI_TIMEOUT,
+            stream=True,
+        ) as response:
+            if response.status_code != 200:
                 print(f"API Error: Status {response.status_code}, Response: {response.text}")
-                
-        except Exception as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(delay)
-                delay *= 2
-            else:
-                return "Error: Unable to generate rewrite."
-    return "Error: All retry attempts failed."
+                yield "Error: Unable to generate rewrite."
+                return
+            # Each event is a "data: {...}" line holding the next piece of text;
+            # chunk_size=None hands over each chunk as soon as it arrives
+            for line in response.iter_lines(chunk_size=None):
+                if not line.startswith(b"data:"):
+                    continue
+                chunk = line[5:]
+                text = _candidate_text(orjson.loads(chunk) if orjson is not None else json.loads(chunk))
+                if text:
+                    sent_any = True
+                    yield text
+    except (requests.RequestException, ValueError, IndexError, AttributeError) as e:  # malformed event
+        print(f"Streaming request failed: {e}")
+        yield STREAM_INTERRUPTED if sent_any else "Error: Unable to generate rewrite."
 
 # -----------------------------------------------------------------
 # [MODIFIED] 'Rewrite Section' now uses Gemini for 3 options
 # -----------------------------------------------------------------
+def _rewrite_prompt(text: str) -> str:
+    # We add the original text to the prompt so the model can include it in its JSON response
+    user_prompt = f"Original text to rewrite:\n\n\"{text}\""
+    return f"{user_prompt}\n\nReturn JSON with 'original' set to the original text."
+
 def rewrite_section(text: str) -> dict:
     """
     Generates 3 rewrite options (Professional, Concise, Simpler)
     for the 'Rewrite Section' button using the Gemini API.
     Returns a JSON string, which Flask will pass to the frontend.
     """
+    key = _cache_key("rewrite", text)
+    if rewrite_cache is not None:
+        cached = rewrite_cache.get(key)
+        if cached is not None:
+            return cached
+
     print("Calling Gemini API for 3 rewrite options...")
     
-    system_prompt = (
-        "You are an expert editor. The user will provide text. "
-        "You must generate three distinct rewrites: "
-        "1. professional: Formal, corporate, and polished. "
-        "2. concise: As short as possible while keeping the core meaning. "
-        "3. simpler: Easy to understand, avoids jargon. "
-        "You must respond *only* with a JSON object."
-    )
-    
-    user_prompt = f"Original text to rewrite:\n\n\"{text}\""
-    
-    # Define the JSON schema we want the model to return
-    json_schema = {
-        "type": "OBJECT",
-        "properties": {
-            "original": { "type": "STRING" },
-            "professional": { "type": "STRING" },
-            "concise": { "type": "STRING" },
-            "simpler": { "type": "STRING" }
-        },
-        "propertyOrdering": ["original", "professional", "concise", "simpler"]
-    }
-    
     # The API will return a JSON *string* that matches this schema
-    # We add the original text to the prompt so the model can include it in its JSON response
-    json_response_string = call_gemini_api(
-        system_prompt, 
-        f"{user_prompt}\n\nReturn JSON with 'original' set to the original text.", 
-        json_schema
-    )
+    json_response_string = call_gemini_api(REWRITE_SYSTEM_PROMPT, _rewrite_prompt(text), REWRITE_SCHEMA)
     
     # Convert the JSON string into a Python dict to send to the frontend
-    try:
-        # We parse the JSON string here, so app.py gets a dictionary
-        loaded_json = json.loads(json_response_string)
+    # We parse the JSON string here, so app.py gets a dictionary
+    loaded_json = extract_json(json_response_string)
+    if isinstance(loaded_json, dict):
         # Ensure 'original' key is present
         if 'original' not in loaded_json:
              loaded_json['original'] = text
+        if rewrite_cache is not None:
+            rewrite_cache.set(key, loaded_json, expire=REWRITE_CACHE_TTL)
         return loaded_json
-    except json.JSONDecodeError:
+    else:
         print(f"Error: Could not decode JSON from model: {json_response_string}")
         return {
             "original": text,
@@ -121,6 +253,17 @@ def rewrite_section(text: str) -> dict:
         }
 
 
+def rewrite_section_stream(text: str):
+    """
+    Streaming variant of rewrite_section: yields the model's JSON reply in
+    chunks as it is generated. Joined together, the chunks form the same
+    JSON object rewrite_section parses (or an "Error: ..." string); a reply
+    cut short ends with STREAM_INTERRUPTED.
+    """
+    print("Streaming Gemini API for 3 rewrite options...")
+    return stream_gemini_api(REWRITE_SYSTEM_PROMPT, _rewrite_prompt(text), REWRITE_SCHEMA)
+
+
 # -----------------------------------------------------------------
 # 'Fix Conflicts' (still uses Gemini API)
 # -----------------------------------------------------------------
@@ -130,14 +273,14 @@ def rewrite_to_fix_conflicts(original_text: str, issues_report: str) -> str:
     This still uses the Gemini API as it's the only one that
     can reliably follow the instruction to "fix these specific errors."
     """
+    key = _cache_key("fix", original_text, issues_report)
+    if rewrite_cache is not None:
+        cached = rewrite_cache.get(key)
+        if cached is not None:
+            return cached
+
     print("Calling Gemini to fix detected inconsistencies...")
     
-    system_prompt = (
-        "You are an expert document editor. Your task is to rewrite a piece of text to resolve a specific list of "
-        "detected contradictions. You must produce a single, clean, and professionally written block of text "
-        "that is logically consistent. Do not just comment on the errors; fix them."
-    )
-    
     user_prompt = (
         f"Please rewrite the following text to resolve all the inconsistencies listed below.\n\n"
         f"--- ORIGINAL TEXT ---\n"
@@ -148,5 +291,8 @@ def rewrite_to_fix_conflicts(original_text: str, issues_report: str) -> str:
     )
     
     # This call does not need a JSON schema
-    corrected_text = call_gemini_api(system_prompt, user_prompt)
+    corrected_text = call_gemini_api(FIX_CONFLICTS_SYSTEM_PROMPT, user_prompt)
+    # Blank replies (blocked or empty candidate) are not worth keeping either
+    if rewrite_cache is not None and corrected_text and not corrected_text.startswith("Error"):
+        rewrite_cache.set(key, corrected_text, expire=REWRITE_CACHE_TTL)
     return corrected_text
\ No newline at end of file
@@ -0,0 +1,37 @@
+# scripts/build_contexts.py
+# -----------------------------------------------------
+# Freezes the WordNet synonyms of the context keywords
+# -----------------------------------------------------
+# Writes context_synonyms.json, which consistency_model.py reads at startup
+# instead of querying WordNet. Re-run after editing the keywords in CONTEXTS
+# (keywords missing from the file still fall back to WordNet).
+#
+#   python scripts/build_contexts.py
+#
+# Importing consistency_model also loads the NLI model.
+# -----------------------------------------------------
+
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+def main():
+    import nltk
+    nltk.download("wordnet", quiet=True)
+    import consistency_model
+
+    frozen = {
+        keyword: sorted(consistency_model.get_synonyms(keyword))
+        for context_data in consistency_model.CONTEXTS.values()
+        for keyword in context_data["keywords"]
+    }
+    with open(consistency_model.CONTEXT_SYNONYMS_FILE, "w", encoding="utf-8") as f:
+        json.dump(frozen, f, indent=4, ensure_ascii=False)
+    print(f"Wrote {consistency_model.CONTEXT_SYNONYMS_FILE} ({len(frozen)} keywords)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# scripts/export_onnx.py
+# -----------------------------------------------------
+# Exports the NLI model to ONNX and quantizes it to int8
+# -----------------------------------------------------
+# consistency_model.py picks up onnx/model-int8.onnx automatically when
+# optimum[onnxruntime] is installed; delete the folder to go back to FP32.
+#
+#   pip install "optimum[onnxruntime]"
+#   python scripts/export_onnx.py
+# -----------------------------------------------------
+
+import argparse
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the NLI model to ONNX with dynamic int8 weights.")
+    parser.add_argument("--model", default="typeform/distilbert-base-uncased-mnli")
+    parser.add_argument("--out", default=os.path.join(ROOT, "onnx"))
+    args = parser.parse_args()
+
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    # Writes model.onnx plus config.json (labels) into the output folder
+    ORTModelForSequenceClassification.from_pretrained(args.model, export=True).save_pretrained(args.out)
+
+    # Dynamic quantization: int8 weights, activations quantized on the fly
+    quantize_dynamic(
+        os.path.join(args.out, "model.onnx"),
+        os.path.join(args.out, "model-int8.onnx"),
+        weight_type=QuantType.QInt8,
+    )
+    print(f"Wrote {os.path.join(args.out, 'model-int8.onnx')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+#!/usr/bin/env bash
+# Records a py-spy flame graph of scripts/profile_app.py (pip install py-spy).
+#   scripts/flamegraph.sh consistency --repeat 3
+set -euo pipefail
+cd "$(dirname "$0")/.."
+py-spy record --output "${FLAMEGRAPH_OUT:-flamegraph.svg}" -- python scripts/profile_app.py "$@"
@@ -0,0 +1,62 @@
+# scripts/profile_app.py
+# -----------------------------------------------------
+# Profiles the /process hot paths with cProfile
+# -----------------------------------------------------
+# Sends canned payloads through Flask's test client (no server needed)
+# and prints the top-20 functions by cumulative time.
+#
+#   python scripts/profile_app.py                      # expand + citation
+#   python scripts/profile_app.py consistency --repeat 3 --out before.prof
+#
+# 'rewrite' and 'consistency' call Gemini, so they need GEMINI_API_KEY.
+# -----------------------------------------------------
+
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # data files (abbreviations_local.json) are resolved relative to the repo
+
+SAMPLE_TEXT = (
+    "The CEO approved a budget of $50,000 for the NLP project in Q3. "
+    "Our KPI target is a 15% increase in revenue by the end of the year. "
+    "The ML team will deliver the first milestone within 6 months. "
+    "According to the SLA, the total budget is $45,000 for this project. "
+    "The timeline was extended so the milestone is now due in 8 months."
+)
+
+PAYLOADS = {
+    "expand": {"action": "expand", "text": SAMPLE_TEXT},
+    "citation": {"action": "citation", "text": "Smith, J. (2020). \"Deep Nets\" Nature Press.", "style": "ieee"},
+    "rewrite": {"action": "rewrite", "text": SAMPLE_TEXT},
+    "consistency": {"action": "consistency", "text": SAMPLE_TEXT},
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile /process actions with cProfile.")
+    parser.add_argument("actions", nargs="*", default=["expand", "citation"], choices=sorted(PAYLOADS))
+    parser.add_argument("--repeat", type=int, default=20, help="requests per action")
+    parser.add_argument("--out", default="profile.prof", help="where to write the raw pstats dump")
+    args = parser.parse_args()
+
+    from app import app  # imported here so model loading isn't profiled
+    client = app.test_client()
+
+    profiler = cProfile.Profile()
+    for action in args.actions:
+        profiler.enable()
+        for _ in range(args.repeat):
+            # nocache=1 so every request exercises the real pipeline
+            client.post("/process?nocache=1", json=PAYLOADS[action])
+        profiler.disable()
+
+    profiler.dump_stats(args.out)
+    print(f"Wrote {args.out}")
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+if __name__ == "__main__":
+    main()